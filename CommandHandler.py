@@ -2,6 +2,7 @@ import struct
 import zlib
 import time
 import asyncio
+from contextlib import contextmanager
 from typing import Union, Optional, Tuple, Dict
 from CRC32 import CRC32
 from OTACommands import OTACommands
@@ -17,6 +18,7 @@ class CommandHandler:
         self._current_sequence = 0
         self._response_buffer = bytearray()
         self.crc = CRC32()
+        self.verbose = True  # per-packet console logging
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
 
@@ -26,13 +28,15 @@ class CommandHandler:
         """Async version of send_command_and_wait_response"""
         for attempt in range(retries):
             packet = self.build_command_packet(command, data, packet_sequence)
-            print(f"Command Packet (hex): {packet.hex().upper()}")
+            if self.verbose:
+                print(f"Command Packet (hex): {packet.hex().upper()}")
             
             if not await self.ble.write_data(packet):
                 continue
             
-            ct = time.time()
-            print(f"Time: {time.ctime(ct)}")
+            if self.verbose:
+                ct = time.time()
+                print(f"Time: {time.ctime(ct)}")
             
             # Wait for response
             response_data = await self.ble.read_response(timeout)
@@ -72,4 +76,28 @@ class CommandHandler:
     
     def is_connected(self):
         """Check connection status"""
-        return self.ble.is_connected()
\ No newline at end of file
+        return self.ble.is_connected()
+    
+    def set_verbose(self, verbose: bool):
+        """Enable or disable per-packet console logging"""
+        self.verbose = verbose
+        self.ble.verbose = verbose
+    
+    @contextmanager
+    def quiet(self):
+        """Suppress per-packet console logging inside a with-block"""
+        verbose, ble_verbose = self.verbose, self.ble.verbose
+        self.set_verbose(False)
+        try:
+            yield
+        finally:
+            self.verbose = verbose
+            self.ble.verbose = ble_verbose
+    
+    def set_connection_profile(self, profile):
+        """Request BLE link parameters (see ConnectionProfile)"""
+        return self.loop.run_until_complete(self.ble.request_connection_profile(profile))
+    
+    def get_link_params(self):
+        """Link parameters recorded by the last connection profile request"""
+        return dict(self.ble.link_params)
\ No newline at end of file
@@ -0,0 +1,18 @@
+class ConnectionProfile:
+    """Connection parameter preset requested for one phase of an OTA session"""
+
+    def __init__(self, name: str, winrt_preset: str):
+        self.name = name
+        self.winrt_preset = winrt_preset  # BluetoothLEPreferredConnectionParameters preset
+
+    def __repr__(self):
+        return f"ConnectionProfile({self.name})"
+
+
+# Short interval (the OS may also pick 2M PHY) while firmware chunks are streamed
+ConnectionProfile.HIGH_THROUGHPUT = ConnectionProfile(
+    name="high_throughput", winrt_preset="throughput_optimized")
+
+# Long interval with slave latency once the upload phase is over
+ConnectionProfile.LOW_POWER = ConnectionProfile(
+    name="low_power", winrt_preset="power_optimized")
@@ -1,21 +1,34 @@
+import heapq
 import os
+import zlib
 from typing import Optional, Tuple, Dict
 from CRC32 import CRC32
 from OTACommands import OTACommands
+from ConnectionProfile import ConnectionProfile
+from ProgressReporter import ProgressReporter
 
 class FwUpload:
     CHUNK_SIZE = 192  # Fixed chunk size of 200 bytes
     MINIMUM_NO_OF_DATA_CHUNKS = 10  # minimum number of chunks
+    REPAIR_CRC_QUERY_FRACTION = 0.1  # max range CRC requests per repair, as share of chunks
+    REPAIR_MAX_RESEND_FRACTION = 0.5  # above this share of chunks, re-upload instead
+    REPAIR_CRC_TIMEOUT = 2.0  # seconds per range CRC request, no retries
     DEFAULT_FW_PATH = r"D:\fw\appcm4.bin"  # Raw string for Windows path
 
-    def __init__(self, command_handler, file_path: str = None):
+    def __init__(self, command_handler, file_path: str = None, progress_callback=None):
         self.command_handler = command_handler
         self.firmware_data = b''
         self.total_chunks = 0
         self.file_crc = 0
+        self.chunk_crcs = []
         self.target_core = 0
         self.file_path = file_path if file_path else self.DEFAULT_FW_PATH
-        self.crc = CRC32()        
+        self.crc = CRC32()
+        self.progress = ProgressReporter(progress_callback)
+
+    def set_progress_callback(self, callback):
+        """Set observer for phase/progress events (see ProgressReporter)"""
+        self.progress.set_callback(callback)
 
     def load_firmware_file(self) -> bool:
         try:
@@ -28,6 +41,7 @@ class FwUpload:
 
             file_size = len(self.firmware_data)
             self.total_chunks = (file_size + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+            self.chunk_crcs = []
             print(f"Loaded firmware: {file_size} bytes, {self.total_chunks} chunks")
             return True
             
@@ -48,18 +62,23 @@ class FwUpload:
         return self.file_crc
 
 
-    def full_update_workflow(self) -> bool:
+    def full_update_workflow(self, repair: bool = False) -> bool:
         """
         Complete firmware update sequence:
         1. Load firmware file
         2. Calculate file metadata (CRC, size, chunks)
         3. Initialize OTA with device
-        4. Upload all chunks sequentially
-        5. Verify firmware with device
+        4. Upload all chunks sequentially (high-throughput link profile)
+        5. Verify firmware with device, then switch to low-power link profile
+        Args:
+            repair: On verification failure, locate and re-send corrupted chunks
+                    (needs range CRC support for CMD_CRC_INACTIVE on the device)
         """
         # Step 1: Load firmware file
+        self.progress.start_phase("load")
         if not self.load_firmware_file():
             print("Error: Failed to load firmware file")
+            self.progress.start_phase("failed")
             return False
 
         # Step 2: Calculate file metadata
@@ -77,18 +96,30 @@ class FwUpload:
         #    print("Error: OTA initialization failed")
         #    return False
 
-        # Step 4: Upload chunks
-        if not self.upload_chunks(timeout=20,no_of_retries=1):
-            print("Error: Firmware upload failed")
-            return False
+        # Step 4: Upload chunks on a high-throughput link
+        if not self.command_handler.set_connection_profile(ConnectionProfile.HIGH_THROUGHPUT):
+            print("Warning: High-throughput connection profile not applied")
 
-        # Step 5: Verify firmware
-        print("verify firmware secondary location")
-        if not self.verify_firmware():
-            print("Error: Firmware verification failed")
-            return False
+        try:
+            if not self.upload_chunks(timeout=20,no_of_retries=1):
+                print("Error: Firmware upload failed")
+                self.progress.start_phase("failed")
+                return False
+
+            # Step 5: Verify firmware
+            print("verify firmware secondary location")
+            self.progress.start_phase("verify")
+            verified = self.verify_and_repair() if repair else self.verify_firmware()
+            if not verified:
+                print("Error: Firmware verification failed")
+                self.progress.start_phase("failed")
+                return False
+        finally:
+            if self.command_handler.is_connected():
+                self.command_handler.set_connection_profile(ConnectionProfile.LOW_POWER)
 
         print("Firmware update completed successfully!")
+        self.progress.start_phase("done")
         return True
 
     def init_OTA(self, core=OTACommands.CM4) -> bool:
@@ -164,39 +195,16 @@ class FwUpload:
         Returns:
             bool: True if all chunks were uploaded successfully
          """
-        for chunk_idx in range(self.total_chunks):
-            # Calculate chunk start/end positions
-            start = chunk_idx * self.CHUNK_SIZE
-            end = start + self.CHUNK_SIZE
-            chunk = self.firmware_data[start:end]
-
-            # Pad last chunk if needed
-            if len(chunk) < self.CHUNK_SIZE and chunk_idx == self.total_chunks - 1:
-                chunk += b'\xFF' * (self.CHUNK_SIZE - len(chunk))
+        self.progress.start_phase("upload", self.total_chunks)
 
-            print(f"Uploading chunk {chunk_idx + 1}/{self.total_chunks} "
-              f"(Size: {len(chunk)} bytes)")
+        # No per-packet console output inside the upload loop
+        with self.command_handler.quiet():
+            for chunk_idx in range(self.total_chunks):
+                if not self._send_chunk(chunk_idx, timeout, no_of_retries):
+                    return False
 
-            # Send chunk with retries
-            success, response = self.command_handler.send_command_and_wait_response(
-                command=OTACommands.CMD_UPLOAD_FIRMWARE_CHUNK,
-                packet_sequence=chunk_idx,
-                data=chunk,
-                timeout=timeout,
-                retries=no_of_retries
-            )
-
-            if not success:
-                print(f"Error: Failed to upload chunk {chunk_idx}")
-                return False
-
-            if response.get('packet_type') != OTACommands.RESPONSE_ACK:
-                print(f"Error: Device rejected chunk {chunk_idx}")
-                return False
+                self.progress.update(chunk_idx + 1, (chunk_idx + 1) * self.CHUNK_SIZE)
 
-            # Optional: Progress indicator
-            progress = (chunk_idx + 1) / self.total_chunks * 100
-            print(f"Progress: {progress:.1f}%")
         # Send last chunck
         '''
         final_packet =  0xFF00
@@ -211,6 +219,36 @@ class FwUpload:
 
         return True
 
+    def _get_chunk(self, chunk_idx: int) -> bytes:
+        # Calculate chunk start/end positions
+        start = chunk_idx * self.CHUNK_SIZE
+        end = start + self.CHUNK_SIZE
+        chunk = self.firmware_data[start:end]
+
+        # Pad last chunk if needed
+        if len(chunk) < self.CHUNK_SIZE and chunk_idx == self.total_chunks - 1:
+            chunk += b'\xFF' * (self.CHUNK_SIZE - len(chunk))
+        return chunk
+
+    def _send_chunk(self, chunk_idx: int, timeout: float, no_of_retries: int) -> bool:
+        # Send chunk with retries
+        success, response = self.command_handler.send_command_and_wait_response(
+            command=OTACommands.CMD_UPLOAD_FIRMWARE_CHUNK,
+            packet_sequence=chunk_idx,
+            data=self._get_chunk(chunk_idx),
+            timeout=timeout,
+            retries=no_of_retries
+        )
+
+        if not success:
+            print(f"Error: Failed to upload chunk {chunk_idx}")
+            return False
+
+        if response.get('packet_type') != OTACommands.RESPONSE_ACK:
+            print(f"Error: Device rejected chunk {chunk_idx}")
+            return False
+        return True
+
     def verify_firmware(self) -> bool:
         """
         Verify firmware CRC with device
@@ -232,6 +270,175 @@ class FwUpload:
         print("New Firmware verification failed")
         return False
     
+    def build_chunk_crc_index(self) -> list:
+        """CRC32 of every (padded) chunk as written to the device"""
+        self.chunk_crcs = []
+        self.chunk_crcs = [self._host_range_crc(idx, 1) for idx in range(self.total_chunks)]
+        return self.chunk_crcs
+
+    def read_device_crc(self, offset: int, length: int) -> Optional[int]:
+        """
+        Read CRC32 over a byte range of the inactive firmware slot
+        Payload: offset (4 bytes) + length (4 bytes), CRC returned in response data
+        """
+        payload = offset.to_bytes(4, 'big') + length.to_bytes(4, 'big')
+        success, response = self.command_handler.send_command_and_wait_response(
+            command=OTACommands.CMD_CRC_INACTIVE,
+            data=payload,
+            timeout=self.REPAIR_CRC_TIMEOUT,
+            retries=1
+        )
+        if not success or response.get('packet_type') != OTACommands.RESPONSE_ACK:
+            print(f"Error: CRC read failed at offset 0x{offset:08X}, length {length}")
+            return None
+
+        data = response.get('data') or b''
+        if len(data) < 4:
+            print(f"Error: CRC response too short ({len(data)} bytes)")
+            return None
+        return int.from_bytes(data[:4], 'big')
+
+    def _host_range_crc(self, first_chunk: int, count: int) -> int:
+        if count == 1 and len(self.chunk_crcs) == self.total_chunks:
+            return self.chunk_crcs[first_chunk]
+
+        start = first_chunk * self.CHUNK_SIZE
+        end = start + count * self.CHUNK_SIZE
+        data = self.firmware_data[start:end]
+        # Last chunk is padded on the device
+        data += b'\xFF' * (end - start - len(data))
+
+        # Same as CRC32.calculate_crc32(data, 0xFFFFFFFF), in C
+        return zlib.crc32(data) ^ 0xFFFFFFFF
+
+    def find_corrupted_chunks(self) -> Optional[list]:
+        """
+        Search the inactive slot for chunks whose device CRC differs from the
+        host CRC index, always splitting the largest known-bad range next.
+        Assumes verify_firmware() already failed, so the whole image is not
+        read again. Bad ranges still unsplit when the CRC request budget is
+        used up are returned whole.
+        Returns:
+            list: indices of corrupted chunks, None if the device CRC could not be read
+        """
+        if len(self.chunk_crcs) != self.total_chunks:
+            self.build_chunk_crc_index()
+        if self.total_chunks == 1:
+            return [0]
+
+        budget = max(2, int(self.total_chunks * self.REPAIR_CRC_QUERY_FRACTION))
+        queries = 0
+
+        corrupted = []
+        bad_ranges = []  # heap of (-count, first_chunk)
+
+        def add_bad(first_chunk, count):
+            if count == 1:
+                corrupted.append(first_chunk)
+            else:
+                heapq.heappush(bad_ranges, (-count, first_chunk))
+
+        # Query both halves first: a device that ignores offset/length returns
+        # the same CRC for both, and searching would then re-send everything
+        half = self.total_chunks // 2
+        left_crc = self.read_device_crc(0, half * self.CHUNK_SIZE)
+        if left_crc is None:
+            return None
+        right_crc = self.read_device_crc(half * self.CHUNK_SIZE,
+                                         (self.total_chunks - half) * self.CHUNK_SIZE)
+        if right_crc is None:
+            return None
+        queries += 2
+        left_host = self._host_range_crc(0, half)
+        right_host = self._host_range_crc(half, self.total_chunks - half)
+        if left_crc == right_crc and left_host != right_host:
+            print("Error: Device does not support range CRC")
+            return None
+        if left_crc != left_host:
+            add_bad(0, half)
+        if right_crc != right_host:
+            add_bad(half, self.total_chunks - half)
+
+        while bad_ranges and queries < budget:
+            count, first_chunk = heapq.heappop(bad_ranges)
+            count = -count
+            half = count // 2
+
+            left_ok = self._range_matches(first_chunk, half)
+            queries += 1
+            if left_ok is None:
+                return None
+            if left_ok:
+                # Parent is bad, so the right half must be
+                add_bad(first_chunk + half, count - half)
+                continue
+
+            add_bad(first_chunk, half)
+            if queries >= budget:
+                add_bad(first_chunk + half, count - half)
+                continue
+            right_ok = self._range_matches(first_chunk + half, count - half)
+            queries += 1
+            if right_ok is None:
+                return None
+            if not right_ok:
+                add_bad(first_chunk + half, count - half)
+
+        if bad_ranges:
+            print(f"CRC request budget ({budget}) used, re-sending {len(bad_ranges)} whole range(s)")
+            for count, first_chunk in bad_ranges:
+                corrupted.extend(range(first_chunk, first_chunk - count))
+
+        corrupted.sort()
+        return corrupted
+
+    def _range_matches(self, first_chunk: int, count: int) -> Optional[bool]:
+        device_crc = self.read_device_crc(first_chunk * self.CHUNK_SIZE, count * self.CHUNK_SIZE)
+        if device_crc is None:
+            return None
+        return device_crc == self._host_range_crc(first_chunk, count)
+
+    def verify_and_repair(self, max_rounds: int = 2, timeout: float = 20.0,
+                          no_of_retries: int = 3) -> bool:
+        """
+        Verify firmware and, on failure, re-send only the corrupted chunks
+        Args:
+            max_rounds: Number of locate/re-send/verify rounds
+        Returns:
+            bool: True if device confirms firmware is valid
+        """
+        if self.verify_firmware():
+            return True
+
+        for round_idx in range(max_rounds):
+            print(f"Locating corrupted chunks (round {round_idx + 1}/{max_rounds})...")
+            corrupted = self.find_corrupted_chunks()
+            if corrupted is None:
+                print("Error: Device range CRC unavailable, full re-upload required")
+                return False
+            if not corrupted:
+                print("Error: All chunk ranges match but image verification failed")
+                return False
+            if len(corrupted) > self.total_chunks * self.REPAIR_MAX_RESEND_FRACTION:
+                print(f"Error: {len(corrupted)}/{self.total_chunks} chunks to repair, full re-upload required")
+                return False
+
+            print(f"Re-sending {len(corrupted)} corrupted chunk(s)")
+            self.progress.start_phase("repair", len(corrupted))
+
+            # No per-packet console output inside the repair loop
+            with self.command_handler.quiet():
+                for done, chunk_idx in enumerate(corrupted, 1):
+                    if not self._send_chunk(chunk_idx, timeout, no_of_retries):
+                        return False
+                    self.progress.update(done, done * self.CHUNK_SIZE)
+
+            self.progress.start_phase("verify")
+            if self.verify_firmware():
+                return True
+
+        return False
+
     def verify_active_firmware(self) -> bool:
         crc_bytes = self.file_crc.to_bytes(4, 'big')
     
@@ -0,0 +1,78 @@
+import time
+from typing import Callable, Optional
+
+
+class ProgressReporter:
+    """
+    Emits rate-limited progress events for an OTA session.
+
+    Events are plain dicts passed to the callback:
+        {'type': 'phase', 'phase': str, 'timestamp': float}
+        {'type': 'progress', 'phase': str, 'done': int, 'total': int,
+         'percent': float, 'bytes_done': int, 'throughput_bps': float,
+         'eta_s': Optional[float], 'timestamp': float}
+    """
+    EVENT_PHASE = "phase"
+    EVENT_PROGRESS = "progress"
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None,
+                 min_interval: float = 0.5):
+        self.callback = callback if callback else print_progress
+        self.min_interval = min_interval  # seconds between progress events
+        self.phase = None
+        self.total = 0
+        self._phase_start = 0.0
+        self._last_emit = 0.0
+
+    def set_callback(self, callback: Optional[Callable[[dict], None]]):
+        """Set observer for progress events (None restores console output)"""
+        self.callback = callback if callback else print_progress
+
+    def start_phase(self, phase: str, total: int = 0):
+        """Announce a new phase, total is the number of work items in it"""
+        self.phase = phase
+        self.total = total
+        self._phase_start = time.monotonic()
+        self._last_emit = 0.0
+        self._emit({'type': self.EVENT_PHASE, 'phase': phase, 'timestamp': time.time()})
+
+    def update(self, done: int, bytes_done: int = 0, force: bool = False):
+        """Report progress, dropped unless min_interval has elapsed or forced"""
+        now = time.monotonic()
+        if not force and done < self.total and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+
+        elapsed = now - self._phase_start
+        throughput = bytes_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if done and elapsed > 0:
+            eta = (self.total - done) * elapsed / done
+
+        self._emit({
+            'type': self.EVENT_PROGRESS,
+            'phase': self.phase,
+            'done': done,
+            'total': self.total,
+            'percent': done / self.total * 100 if self.total else 100.0,
+            'bytes_done': bytes_done,
+            'throughput_bps': throughput,
+            'eta_s': eta,
+            'timestamp': time.time(),
+        })
+
+    def _emit(self, event: dict):
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"Progress callback error: {e}")
+
+
+def print_progress(event: dict):
+    """Default observer: one console line per (rate-limited) event"""
+    if event['type'] == ProgressReporter.EVENT_PHASE:
+        print(f"Phase: {event['phase']}")
+        return
+    eta = f"{event['eta_s']:.0f}s" if event['eta_s'] is not None else "--"
+    print(f"Progress: {event['done']}/{event['total']} ({event['percent']:.1f}%), "
+          f"{event['throughput_bps'] / 1024:.1f} KiB/s, ETA {eta}")
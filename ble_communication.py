@@ -1,10 +1,25 @@
 import asyncio
+import importlib
 import time
 from typing import Optional, Callable
 from bleak import BleakClient, BleakScanner
 from bleak.exc import BleakError
+from ConnectionProfile import ConnectionProfile
+
+
+def _winrt_bluetooth_module():
+    """Return the WinRT Bluetooth projection used by bleak, if available"""
+    for name in ("winrt.windows.devices.bluetooth", "bleak_winrt.windows.devices.bluetooth"):
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            continue
+    return None
+
 
 class BLECommunicator:
+    LINK_UPDATE_TIMEOUT = 2.0  # seconds to wait for a connection parameter update
+    
     def __init__(self, device_name="BMS_LE", 
                  service_uuid="d98cb893-05d5-445e-93a4-40a000030000",
                  command_char_uuid="d98cb893-05d5-445e-93a4-40c000030001",
@@ -22,6 +37,13 @@ class BLECommunicator:
         self.response_queue = asyncio.Queue()
         self.response_event = asyncio.Event()
         self.current_response = None
+        self.verbose = True  # per-packet console logging
+        
+        # Connection parameter tuning state
+        self.active_profile = None
+        self.link_params = {}
+        self.link_history = []  # link_params of finished profiles
+        self._winrt_param_request = None
         
     def _notification_handler(self, sender, data):
         """Handle incoming notifications from response characteristic"""
@@ -100,6 +122,14 @@ class BLECommunicator:
                     await self.client.start_notify(self.response_char.uuid, self._notification_handler)
                     print("✅ Notifications enabled")
                 
+                # BlueZ reports the default MTU until it has been acquired explicitly
+                backend = getattr(self.client, "_backend", None)
+                if hasattr(backend, "_acquire_mtu"):
+                    try:
+                        await backend._acquire_mtu()
+                    except Exception:
+                        pass
+                
                 return True
                 
             except asyncio.TimeoutError:
@@ -128,7 +158,8 @@ class BLECommunicator:
             
             # Write data
             await self.client.write_gatt_char(self.command_char.uuid, data)
-            print(f"📤 Sent {len(data)} bytes: {data.hex().upper()}")
+            if self.verbose:
+                print(f"📤 Sent {len(data)} bytes: {data.hex().upper()}")
             return True
             
         except Exception as e:
@@ -156,6 +187,8 @@ class BLECommunicator:
         """Disconnect from device"""
         if self.client:
             try:
+                await self.end_connection_profile()
+                
                 # Stop notifications
                 if self.response_char:
                     await self.client.stop_notify(self.response_char.uuid)
@@ -166,10 +199,173 @@ class BLECommunicator:
             except Exception as e:
                 print(f"❌ Disconnect error: {e}")
             finally:
+                self._release_winrt_param_request()
+                self.active_profile = None
                 self.client = None
                 self.command_char = None
                 self.response_char = None
     
+    async def request_connection_profile(self, profile: ConnectionProfile):
+        """
+        Request the connection parameter preset of the given profile and record
+        what the link actually negotiated in self.link_params.
+        Returns True only if the local stack accepted the request.
+        """
+        if not self.is_connected():
+            print("❌ Not connected, cannot apply connection profile")
+            return False
+        
+        # Close the previous phase with the values the link ended up with
+        await self.end_connection_profile()
+        
+        backend = getattr(self.client, "_backend", None)
+        self.link_params = {
+            'profile': profile.name,
+            'requested': profile.winrt_preset,
+            'applied': False,
+            'settled': False,
+            'interval_ms': None,
+            'slave_latency': None,
+            'supervision_timeout_ms': None,
+            'tx_phy': None,
+            'rx_phy': None,
+            'mtu': None,
+        }
+        
+        try:
+            await self._apply_winrt_profile(backend, profile)
+        except Exception as e:
+            print(f"⚠️ Connection parameter request failed: {e}")
+        
+        await self._read_link_params(backend)
+        self.active_profile = profile
+        
+        print(f"🔧 Connection profile '{profile.name}': "
+              f"interval={self.link_params['interval_ms']} ms, "
+              f"latency={self.link_params['slave_latency']}, "
+              f"timeout={self.link_params['supervision_timeout_ms']} ms, "
+              f"PHY tx/rx={self.link_params['tx_phy']}/{self.link_params['rx_phy']}, "
+              f"MTU={self.link_params['mtu']}")
+        if not self.link_params['applied']:
+            print(f"   Preset '{profile.winrt_preset}' not supported by local stack")
+        elif not self.link_params['settled']:
+            print(f"   Link update not reported within {self.LINK_UPDATE_TIMEOUT}s")
+        return self.link_params['applied']
+    
+    async def end_connection_profile(self):
+        """Re-read link parameters of the active profile and append them to link_history"""
+        if self.active_profile is None or not self.is_connected():
+            return
+        await self._read_link_params(getattr(self.client, "_backend", None))
+        self.link_history.append(dict(self.link_params))
+        self.active_profile = None
+    
+    async def _apply_winrt_profile(self, backend, profile: ConnectionProfile):
+        """Apply a preferred connection parameter preset (Windows 11 only)"""
+        device = getattr(backend, "_requester", None)
+        winrt_bt = _winrt_bluetooth_module()
+        if device is None or winrt_bt is None:
+            return
+        if not hasattr(device, "request_preferred_connection_parameters"):
+            return
+        
+        presets = winrt_bt.BluetoothLEPreferredConnectionParameters
+        preset = getattr(presets, profile.winrt_preset)
+        
+        # Subscribe before requesting so the link-layer update is not missed;
+        # WinRT raises these events on its own threads.
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        
+        def on_changed(sender, args):
+            loop.call_soon_threadsafe(changed.set)
+        
+        tokens = []
+        for event in ("connection_parameters_changed", "connection_phy_changed"):
+            add_handler = getattr(device, f"add_{event}", None)
+            if add_handler:
+                tokens.append((event, add_handler(on_changed)))
+        
+        try:
+            # No update event follows if the link already satisfies the preset
+            in_preset = self._winrt_params_match(device, preset)
+            
+            # The preference only holds while its request object is open
+            self._release_winrt_param_request()
+            request = device.request_preferred_connection_parameters(preset)
+            
+            status_enum = winrt_bt.BluetoothLEPreferredConnectionParametersRequestStatus
+            if request.status != getattr(status_enum, "SUCCESS", 1):
+                print(f"⚠️ Connection parameter request rejected: {request.status}")
+                request.close()
+                return
+            
+            self._winrt_param_request = request
+            self.link_params['applied'] = True
+            if in_preset:
+                self.link_params['settled'] = True
+                return
+            
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=self.LINK_UPDATE_TIMEOUT)
+                self.link_params['settled'] = True
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            for event, token in tokens:
+                getattr(device, f"remove_{event}")(token)
+    
+    @staticmethod
+    def _winrt_params_match(device, preset):
+        """Check whether the current connection parameters already fall within the preset"""
+        try:
+            params = device.get_connection_parameters()
+            return (preset.min_connection_interval <= params.connection_interval <= preset.max_connection_interval
+                    and params.connection_latency == preset.connection_latency
+                    and params.link_timeout == preset.link_timeout)
+        except Exception:
+            return False
+    
+    def _release_winrt_param_request(self):
+        if self._winrt_param_request is not None:
+            try:
+                self._winrt_param_request.close()
+            except Exception:
+                pass
+            self._winrt_param_request = None
+    
+    async def _read_link_params(self, backend):
+        """Fill self.link_params with the negotiated values the backend exposes"""
+        try:
+            self.link_params['mtu'] = self.client.mtu_size
+        except Exception:
+            pass
+        
+        device = getattr(backend, "_requester", None)
+        if device is None:
+            return
+        try:
+            params = device.get_connection_parameters()
+            self.link_params['interval_ms'] = params.connection_interval * 1.25
+            self.link_params['slave_latency'] = params.connection_latency
+            self.link_params['supervision_timeout_ms'] = params.link_timeout * 10
+        except Exception:
+            pass
+        try:
+            phy = device.get_connection_phy()
+            self.link_params['tx_phy'] = self._phy_name(phy.transmit_info)
+            self.link_params['rx_phy'] = self._phy_name(phy.receive_info)
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _phy_name(info):
+        if info.is_uncoded2_m_phy:
+            return "2M"
+        if info.is_coded_phy:
+            return "Coded"
+        return "1M"
+    
     def set_response_callback(self, callback: Callable):
         """Set callback for response notifications"""
         self.response_callback = callback
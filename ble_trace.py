@@ -0,0 +1,265 @@
+import asyncio
+import json
+import struct
+import time
+from typing import Callable, List, Optional, Tuple
+
+# Trace file layout:
+#   header: magic (6 bytes) + version (1 byte)
+#   record: type (1 byte) + monotonic timestamp ns since start (8 bytes) + length (2 bytes) + payload
+TRACE_MAGIC = b"OTATRC"
+TRACE_VERSION = 1
+_HEADER = struct.Struct("<6sB")
+_RECORD = struct.Struct("<BQH")
+
+REC_WRITE = 0x01        # payload: bytes written to command characteristic
+REC_NOTIFY = 0x02       # payload: notification from response characteristic
+REC_CONNECT = 0x03      # payload: 0x01 connected, 0x00 failed
+REC_DISCONNECT = 0x04   # payload: empty
+REC_WRITE_FAIL = 0x05   # payload: empty, preceding write was not accepted
+REC_LINK_PARAMS = 0x06  # payload: JSON of negotiated link parameters
+
+
+def read_trace(trace_path: str) -> List[Tuple[int, int, bytes]]:
+    """Load a trace file as a list of (type, timestamp_ns, payload)"""
+    with open(trace_path, 'rb') as f:
+        blob = f.read()
+
+    if len(blob) < _HEADER.size:
+        raise ValueError(f"Not a BLE trace file (v{TRACE_VERSION}): {trace_path}")
+    magic, version = _HEADER.unpack_from(blob, 0)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"Not a BLE trace file (v{TRACE_VERSION}): {trace_path}")
+
+    records = []
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(blob):
+        rec_type, ts_ns, length = _RECORD.unpack_from(blob, offset)
+        offset += _RECORD.size
+        if offset + length > len(blob):
+            break
+        records.append((rec_type, ts_ns, blob[offset:offset + length]))
+        offset += length
+
+    # A session that crashed leaves a partial last record
+    if offset != len(blob):
+        print(f"⚠️ Trace truncated, dropped partial record at byte {offset}: {trace_path}")
+    return records
+
+
+class BLETraceRecorder:
+    """Wraps a BLECommunicator and records every write and notification"""
+
+    def __init__(self, ble_comm, trace_path: str):
+        self.ble = ble_comm
+        self.trace_path = trace_path
+        self._file = open(trace_path, 'wb')
+        self._file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+        self._t0 = time.monotonic_ns()
+
+        # Chain notifications through the recorder
+        self._user_callback = ble_comm.response_callback
+        ble_comm.set_response_callback(self._on_notification)
+
+    def _record(self, rec_type: int, payload: bytes = b''):
+        if self._file is None:
+            return
+        ts_ns = time.monotonic_ns() - self._t0
+        self._file.write(_RECORD.pack(rec_type, ts_ns, len(payload)))
+        self._file.write(payload)
+
+    def _on_notification(self, data):
+        self._record(REC_NOTIFY, bytes(data))
+        if self._user_callback:
+            self._user_callback(data)
+
+    async def connect(self, *args, **kwargs):
+        connected = await self.ble.connect(*args, **kwargs)
+        self._record(REC_CONNECT, b'\x01' if connected else b'\x00')
+        return connected
+
+    async def write_data(self, data):
+        self._record(REC_WRITE, bytes(data))
+        if not await self.ble.write_data(data):
+            self._record(REC_WRITE_FAIL)
+            return False
+        return True
+
+    async def read_response(self, timeout=10.0):
+        return await self.ble.read_response(timeout)
+
+    async def request_connection_profile(self, profile):
+        applied = await self.ble.request_connection_profile(profile)
+        if self.ble.is_connected():
+            self._record(REC_LINK_PARAMS, json.dumps(self.ble.link_params).encode())
+        return applied
+
+    async def disconnect(self):
+        """Disconnect and close the trace; one recorder covers one session"""
+        await self.ble.disconnect()
+        self._record(REC_DISCONNECT)
+        self.close()
+
+    def set_response_callback(self, callback: Callable):
+        """Set callback for response notifications"""
+        self._user_callback = callback
+
+    def is_connected(self):
+        return self.ble.is_connected()
+
+    @property
+    def verbose(self):
+        return self.ble.verbose
+
+    @verbose.setter
+    def verbose(self, value):
+        self.ble.verbose = value
+
+    @property
+    def link_params(self):
+        return self.ble.link_params
+
+    def close(self):
+        """Flush and close the trace file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BLEReplayCommunicator:
+    """
+    Replays a recorded trace in place of a BLECommunicator.
+
+    Each host write is matched to the next recorded write with identical bytes
+    (command, packet sequence and payload); recorded writes in between are
+    skipped. Only notifications recorded after that write, and before the next
+    one, are delivered for it, after the same delay divided by speed.
+    speed=1.0 is faithful timing, speed>1 is faster, speed=0 is zero-delay.
+    A write with no recorded counterpart ends the replayed connection.
+    """
+
+    def __init__(self, trace_path: str, speed: float = 1.0):
+        self.trace_path = trace_path
+        self.speed = speed
+        self.records = read_trace(trace_path)
+        self._cursor = 0
+        self._write_ts = 0
+
+        self.connected = False
+        self.verbose = True
+        self.link_params = {}
+        self.response_callback = None
+        self.current_response = None
+        self.skipped_writes = 0  # recorded writes the host never repeated
+        self.mismatches = 0      # host writes not found in the recording
+
+    async def _sleep(self, seconds: float):
+        if self.speed > 0 and seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+    def _find_write(self, data: bytes) -> Tuple[Optional[int], Optional[int]]:
+        """Return (index of matching write, index of disconnect reached first)"""
+        for idx in range(self._cursor, len(self.records)):
+            rec_type, ts_ns, payload = self.records[idx]
+            if rec_type == REC_DISCONNECT:
+                return None, idx
+            if rec_type == REC_WRITE and payload == data:
+                return idx, None
+        return None, None
+
+    async def connect(self, *args, **kwargs):
+        """Consume the next connect record"""
+        for idx in range(self._cursor, len(self.records)):
+            if self.records[idx][0] == REC_CONNECT:
+                self._cursor = idx + 1
+                self.connected = self.records[idx][2] == b'\x01'
+                return self.connected
+        print("❌ Trace exhausted, no connect record")
+        return False
+
+    async def write_data(self, data):
+        """Match a write against the next recorded write with the same bytes"""
+        if not self.connected:
+            print("❌ Not connected or command characteristic not available")
+            return False
+
+        data = bytes(data)
+        match_idx, disconnect_idx = self._find_write(data)
+        if disconnect_idx is not None:
+            self._cursor = disconnect_idx + 1
+            print("❌ Recorded disconnect")
+            self.connected = False
+            return False
+        if match_idx is None:
+            self.mismatches += 1
+            print(f"❌ Write not in trace, replay stopped: {data.hex().upper()}")
+            self.connected = False
+            return False
+
+        self.skipped_writes += sum(
+            1 for rec_type, _, _ in self.records[self._cursor:match_idx] if rec_type == REC_WRITE)
+        self._cursor = match_idx + 1
+        self._write_ts = self.records[match_idx][1]
+        self.current_response = None
+
+        if self._cursor < len(self.records) and self.records[self._cursor][0] == REC_WRITE_FAIL:
+            self._cursor += 1
+            print("❌ Write error (recorded)")
+            return False
+
+        if self.verbose:
+            print(f"📤 Sent {len(data)} bytes: {data.hex().upper()}")
+        return True
+
+    async def read_response(self, timeout=10.0):
+        """Deliver the notification recorded for the last write after its recorded delay"""
+        if not self.connected:
+            return None
+
+        for idx in range(self._cursor, len(self.records)):
+            rec_type, ts_ns, payload = self.records[idx]
+            if rec_type == REC_WRITE:
+                break
+            if rec_type not in (REC_NOTIFY, REC_DISCONNECT):
+                continue
+
+            delay = (ts_ns - self._write_ts) / 1e9
+            if delay > timeout:
+                break
+            await self._sleep(delay)
+            self._cursor = idx + 1
+
+            if rec_type == REC_DISCONNECT:
+                print("❌ Recorded disconnect")
+                self.connected = False
+                return None
+
+            self.current_response = payload
+            if self.response_callback:
+                self.response_callback(payload)
+            return payload
+
+        await self._sleep(timeout)
+        print("⏰ Response timeout")
+        return None
+
+    async def request_connection_profile(self, profile):
+        for idx in range(self._cursor, len(self.records)):
+            rec_type, ts_ns, payload = self.records[idx]
+            if rec_type in (REC_WRITE, REC_DISCONNECT):
+                break
+            if rec_type == REC_LINK_PARAMS:
+                self._cursor = idx + 1
+                self.link_params = json.loads(payload.decode())
+                return self.link_params.get('applied', False)
+        return False
+
+    async def disconnect(self):
+        self.connected = False
+
+    def set_response_callback(self, callback: Callable):
+        """Set callback for response notifications"""
+        self.response_callback = callback
+
+    def is_connected(self):
+        return self.connected
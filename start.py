@@ -12,6 +12,11 @@ def main():
         response_char_uuid="d98cb893-05d5-445e-93a4-40c000030002"
     )
     
+    # Optional: record the session to a trace file, or replay one offline
+    # from ble_trace import BLETraceRecorder, BLEReplayCommunicator
+    # ble_comm = BLETraceRecorder(ble_comm, "session.trc")
+    # ble_comm = BLEReplayCommunicator("session.trc", speed=0)
+    
     command_handler = CommandHandler(ble_comm)
     fw_upload = FwUpload(command_handler)
     